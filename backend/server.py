@@ -1,19 +1,33 @@
-from fastapi import FastAPI, APIRouter, HTTPException
-from fastapi.responses import RedirectResponse
+from fastapi import FastAPI, APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import ORJSONResponse, RedirectResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 import os
+import sys
+import asyncio
+import time
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, HttpUrl
 from typing import Optional, List
+from collections import Counter, OrderedDict
+from functools import lru_cache
 import string
-import random
-from datetime import datetime
-import qrcode
+from datetime import datetime, timedelta, timezone
+import segno
 import io
-import base64
+import hashlib
+# The server runs with `--loop uvloop --http httptools`; importing them here
+# makes a missing install fail at startup instead of silently falling back.
+# uvloop does not support Windows, where uvicorn uses the default loop.
+if sys.platform != "win32":
+    import uvloop  # noqa: F401
+import httptools  # noqa: F401
 
 
 ROOT_DIR = Path(__file__).parent
@@ -21,11 +35,42 @@ load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(
+    mongo_url,
+    tz_aware=True,
+    maxPoolSize=200,
+    minPoolSize=20,
+    maxIdleTimeMS=60000,
+    retryWrites=True,
+    w=1,
+)
 db = client[os.environ['DB_NAME']]
 
+# Redirect cache settings (short_code -> original_url, held in-process).
+# Each instance has its own cache, so when several instances run behind a
+# load balancer a deleted or re-created code can keep redirecting to its old
+# target on the other instances for up to REDIRECT_CACHE_TTL.
+REDIRECT_CACHE_SIZE = 10000
+REDIRECT_CACHE_TTL = 10  # seconds
+
+# Number of rendered QR code PNGs kept in memory
+QR_CACHE_SIZE = 1024
+
+# Fixed QR mask pattern. Any mask yields a valid code; fixing it skips
+# scoring all eight candidates, which is most of the encode time.
+QR_MASK = 0
+
+# Maximum number of URLs accepted by POST /api/shorten/batch
+MAX_BATCH_SIZE = 100
+
+# MongoDB error code for unique index violations
+DUPLICATE_KEY_ERROR = 11000
+
+# How often buffered click increments are written to MongoDB
+CLICK_FLUSH_INTERVAL = 1.0  # seconds
+
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -41,7 +86,7 @@ class URLResponse(BaseModel):
     short_code: str
     clicks: int
     created_at: datetime
-    qr_code: str
+    qr_code: Optional[str] = None
     custom: bool
 
 class StatsResponse(BaseModel):
@@ -50,78 +95,294 @@ class StatsResponse(BaseModel):
     original_url: str
 
 
+# Characters allowed in generated short codes
+_ALPHABET = string.ascii_letters + string.digits
+
+# Byte -> alphabet lookup table. Only the largest multiple of 62 below 256
+# maps onto the alphabet; the remaining byte values are dropped so every
+# character stays equally likely.
+_UNIFORM_LIMIT = 256 - 256 % len(_ALPHABET)
+_TABLE = bytes(ord(_ALPHABET[b % len(_ALPHABET)]) for b in range(256))
+_REJECT = bytes(range(_UNIFORM_LIMIT, 256))
+
+
 # Helper function to generate random short code
 def generate_short_code(length=6):
-    characters = string.ascii_letters + string.digits
-    return ''.join(random.choice(characters) for _ in range(length))
+    code = b''
+    while len(code) < length:
+        code += os.urandom(length * 2).translate(_TABLE, _REJECT)
+    return code[:length].decode('ascii')
 
 
-# Helper function to generate QR code as base64
-def generate_qr_code(url: str) -> str:
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(url)
-    qr.make(fit=True)
-    
-    img = qr.make_image(fill_color="black", back_color="white")
-    
-    # Convert to base64
+# Helper function to generate QR code as PNG bytes. Rendered images are kept
+# so repeat requests for the same URL skip encoding entirely.
+@lru_cache(maxsize=QR_CACHE_SIZE)
+def generate_qr_code(url: str) -> bytes:
+    qr = segno.make_qr(url, error='l', boost_error=False, mask=QR_MASK)
     buffer = io.BytesIO()
-    img.save(buffer, format='PNG')
-    buffer.seek(0)
-    img_base64 = base64.b64encode(buffer.getvalue()).decode()
-    
-    return f"data:image/png;base64,{img_base64}"
+    qr.save(buffer, kind='png', scale=10, border=4)
+    return buffer.getvalue()
 
 
-@api_router.post("/shorten", response_model=URLResponse)
-async def shorten_url(request: ShortenRequest):
-    """Create a shortened URL"""
-    
-    # If custom code provided, check if it's available
-    if request.custom_code:
-        existing = await db.urls.find_one({"short_code": request.custom_code})
-        if existing:
-            raise HTTPException(status_code=400, detail="Custom code already taken")
-        short_code = request.custom_code
-        custom = True
-    else:
-        # Generate random code and ensure it's unique
-        while True:
-            short_code = generate_short_code()
-            existing = await db.urls.find_one({"short_code": short_code})
-            if not existing:
-                break
-        custom = False
-    
-    # Generate QR code
-    full_url = f"{request.original_url}"
-    qr_code_base64 = generate_qr_code(full_url)
+# In-memory LRU cache with TTL for redirect lookups. All access happens on the
+# event loop thread without awaiting in between, so no locking is needed.
+_redirect_cache: "OrderedDict[str, tuple]" = OrderedDict()
+
+# Bumped whenever a code is invalidated. A redirect records the generation
+# before its lookup and only caches the result if it is unchanged, so a lookup
+# that raced with a delete cannot re-cache the deleted target.
+_cache_generations: "Counter[str]" = Counter()
+
+
+def get_cached_url(short_code: str) -> Optional[str]:
+    entry = _redirect_cache.get(short_code)
+    if entry is None:
+        return None
+    expires_at, original_url = entry
+    if expires_at < time.monotonic():
+        del _redirect_cache[short_code]
+        return None
+    _redirect_cache.move_to_end(short_code)
+    return original_url
+
+
+def cache_url(short_code: str, original_url: str, generation: int):
+    if _cache_generations[short_code] != generation:
+        return
+    _redirect_cache[short_code] = (time.monotonic() + REDIRECT_CACHE_TTL, original_url)
+    _redirect_cache.move_to_end(short_code)
+    if len(_redirect_cache) > REDIRECT_CACHE_SIZE:
+        _redirect_cache.popitem(last=False)
+
+
+def invalidate_cached_url(short_code: str):
+    _cache_generations[short_code] += 1
+    _redirect_cache.pop(short_code, None)
+
+
+# Click increments are counted by redirects and written in aggregated batches
+_pending_clicks: "Counter[str]" = Counter()
+
+
+async def flush_clicks():
+    """Write all pending click increments with a single bulk_write"""
+    global _pending_clicks
+    counts, _pending_clicks = _pending_clicks, Counter()
+    if not counts:
+        return
+    batch = list(counts.items())
+    try:
+        await db.urls.bulk_write(
+            [UpdateOne({"short_code": code}, {"$inc": {"clicks": n}}) for code, n in batch],
+            ordered=False,
+        )
+    except BulkWriteError as e:
+        # Put back only the increments that were not applied
+        failed_indexes = {error["index"] for error in e.details["writeErrors"]}
+        for index in failed_indexes:
+            code, n = batch[index]
+            _pending_clicks[code] += n
+        await bump_click_total(sum(n for i, (_, n) in enumerate(batch) if i not in failed_indexes))
+        raise
+    except Exception:
+        _pending_clicks.update(counts)
+        raise
+    await bump_click_total(sum(counts.values()))
+
+
+# Called only after the clicks are written, so the ETag never changes before
+# the list does. A list read between the two writes pairs new counts with the
+# old ETag, which costs the client one extra refetch, never a stale 304.
+async def bump_click_total(n: int):
+    """Advance the collection-wide click counter used by the /urls ETag"""
+    if n:
+        await db.counters.update_one({"_id": "clicks"}, {"$inc": {"total": n}}, upsert=True)
+
+
+# Set on shutdown; the flusher then runs one last flush and exits instead of
+# being cancelled in the middle of a write
+_stop_click_flusher = asyncio.Event()
+
+
+async def click_flusher():
+    while not _stop_click_flusher.is_set():
+        try:
+            await asyncio.wait_for(_stop_click_flusher.wait(), CLICK_FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        try:
+            await flush_clicks()
+        except Exception:
+            logger.exception("Failed to flush click counts")
+
+
+# Helpers for conditional GET (ETag / If-None-Match)
+def make_etag(*parts) -> str:
+    digest = hashlib.blake2b(":".join(map(str, parts)).encode(), digest_size=8).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates or "*" in candidates
+
+
+# Keyset pagination cursor for GET /api/urls: "<created_at in epoch ms>_<_id>"
+# of the last item on the previous page. _id breaks ties between documents
+# created in the same millisecond (e.g. by a batch insert).
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def encode_cursor(url_doc: dict) -> str:
+    millis = (url_doc["created_at"] - _EPOCH) // timedelta(milliseconds=1)
+    return f"{millis}_{url_doc['_id']}"
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        millis, last_id = cursor.split("_")
+        return _EPOCH + timedelta(milliseconds=int(millis)), ObjectId(last_id)
+    except (ValueError, OverflowError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+
+# Helper function to build a new URL document
+def new_url_doc(request: ShortenRequest) -> dict:
+    # "." would clash with the /api/qr/{short_code}.png route and "/" with any route
+    if request.custom_code and any(char in request.custom_code for char in "./"):
+        raise HTTPException(status_code=400, detail="Custom code cannot contain '.' or '/'")
     
-    # Create URL document
-    url_doc = {
+    # MongoDB stores milliseconds; truncate so the response matches what is stored
+    now = datetime.now(timezone.utc)
+    created_at = now.replace(microsecond=now.microsecond // 1000 * 1000)
+    return {
         "original_url": request.original_url,
-        "short_code": short_code,
+        "short_code": request.custom_code or generate_short_code(),
         "clicks": 0,
-        "created_at": datetime.utcnow(),
-        "qr_code": qr_code_base64,
-        "custom": custom
+        "created_at": created_at,
+        "custom": bool(request.custom_code)
     }
+
+
+# Helper function to insert a URL document, retrying random-code collisions
+async def insert_url_doc(url_doc: dict):
+    # The unique index on short_code rejects collisions, so insert directly
+    # and only retry when a random code happens to be taken
+    while True:
+        try:
+            await db.urls.insert_one(url_doc)
+            return
+        except DuplicateKeyError:
+            if url_doc["custom"]:
+                raise HTTPException(status_code=400, detail="Custom code already taken")
+            url_doc.pop("_id", None)
+            url_doc["short_code"] = generate_short_code()
+
+
+# The documents were just built by the server, so they are sent as-is with
+# orjson; response_model is kept for the OpenAPI schema only
+@api_router.post("/shorten", response_model=URLResponse)
+async def shorten_url(request: ShortenRequest):
+    """Create a shortened URL"""
+    url_doc = new_url_doc(request)
+    await insert_url_doc(url_doc)
+    url_doc.pop("_id")
+    return ORJSONResponse(url_doc)
+
+
+@api_router.post("/shorten/batch", response_model=List[URLResponse])
+async def shorten_batch(batch: List[ShortenRequest]):
+    """Create several shortened URLs with a single insert"""
+    if len(batch) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} URLs per batch")
+    if not batch:
+        return []
     
-    await db.urls.insert_one(url_doc)
+    url_docs = [new_url_doc(request) for request in batch]
+    try:
+        await db.urls.insert_many(url_docs, ordered=False)
+    except BulkWriteError as e:
+        write_errors = e.details["writeErrors"]
+        failed_indexes = {error["index"] for error in write_errors}
+        failed = [url_docs[index] for index in sorted(failed_indexes)]
+        unexpected = any(error["code"] != DUPLICATE_KEY_ERROR for error in write_errors)
+        taken = [doc["short_code"] for doc in failed if doc["custom"]]
+        
+        # An unexpected error or a taken custom code fails the whole batch,
+        # so undo the inserts that did succeed before reporting it
+        if unexpected or taken:
+            inserted_ids = [doc["_id"] for i, doc in enumerate(url_docs) if i not in failed_indexes]
+            await db.urls.delete_many({"_id": {"$in": inserted_ids}})
+            if unexpected:
+                raise
+            raise HTTPException(status_code=400, detail=f"Custom code already taken: {', '.join(taken)}")
+        
+        # Random codes that collided are regenerated one by one
+        for url_doc in failed:
+            url_doc.pop("_id", None)
+            url_doc["short_code"] = generate_short_code()
+            await insert_url_doc(url_doc)
     
-    return URLResponse(**url_doc)
+    for url_doc in url_docs:
+        url_doc.pop("_id")
+    return ORJSONResponse(url_docs)
 
 
+# Rows come straight from our own inserts, so they are sent as-is with
+# orjson; response_model is kept for the OpenAPI schema only
 @api_router.get("/urls", response_model=List[URLResponse])
-async def get_all_urls():
-    """Get all shortened URLs"""
-    urls = await db.urls.find().sort("created_at", -1).to_list(1000)
-    return [URLResponse(**url) for url in urls]
+async def get_all_urls(
+    request: Request,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=1000),
+    before: Optional[str] = None,
+):
+    """Get shortened URLs, newest first, one page at a time"""
+    # Fingerprint the collection with cheap reads first (collection metadata,
+    # the newest document via the created_at index and the click counter) so
+    # unchanged clients get a bodyless 304
+    count, newest, clicks = await asyncio.gather(
+        db.urls.estimated_document_count(),
+        db.urls.find_one({}, {"created_at": 1}, sort=[("created_at", -1), ("_id", -1)]),
+        db.counters.find_one({"_id": "clicks"}),
+    )
+    etag = make_etag(
+        count,
+        newest and newest["_id"],
+        newest and newest.get("created_at"),
+        clicks and clicks["total"],
+    )
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    # `before` is the X-Next-Cursor returned with the previous page
+    query = {}
+    if before:
+        created_at, last_id = decode_cursor(before)
+        query = {"$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": last_id}},
+        ]}
+    
+    # Older documents still carry an inline base64 QR code; leave it in the
+    # database, clients fetch QR images from /api/qr/{short_code}
+    cursor = (
+        db.urls.find(query, projection={"qr_code": 0})
+        .sort([("created_at", -1), ("_id", -1)])
+        .skip(skip)
+        .limit(limit)
+    )
+    urls = await cursor.to_list(limit)
+    
+    headers = {"ETag": etag}
+    if len(urls) == limit:
+        headers["X-Next-Cursor"] = encode_cursor(urls[-1])
+    for url in urls:
+        del url["_id"]
+    return ORJSONResponse(urls, headers=headers)
 
 
 @api_router.delete("/urls/{short_code}")
@@ -130,37 +391,69 @@ async def delete_url(short_code: str):
     result = await db.urls.delete_one({"short_code": short_code})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="URL not found")
+    # Invalidate only after the delete; redirects whose lookup started earlier
+    # see the bumped generation and skip caching their result
+    invalidate_cached_url(short_code)
     return {"message": "URL deleted successfully"}
 
 
 @api_router.get("/stats/{short_code}", response_model=StatsResponse)
-async def get_stats(short_code: str):
+async def get_stats(short_code: str, request: Request):
     """Get statistics for a shortened URL"""
-    url = await db.urls.find_one({"short_code": short_code})
+    url = await db.urls.find_one(
+        {"short_code": short_code},
+        {"short_code": 1, "clicks": 1, "original_url": 1, "_id": 0}
+    )
     if not url:
         raise HTTPException(status_code=404, detail="URL not found")
     
-    return StatsResponse(
-        short_code=url["short_code"],
-        clicks=url["clicks"],
-        original_url=url["original_url"]
-    )
+    etag = make_etag(url["short_code"], url["clicks"], url["original_url"])
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    return ORJSONResponse(url, headers={"ETag": etag})
+
+
+# Decorators apply bottom-up, so the .png route is registered and matched first
+@api_router.get("/qr/{short_code}")
+@api_router.get("/qr/{short_code}.png")
+async def get_qr_code(short_code: str, request: Request):
+    """Get the QR code for a shortened URL as a PNG image"""
+    url = await db.urls.find_one({"short_code": short_code}, {"original_url": 1, "_id": 0})
+    if not url:
+        raise HTTPException(status_code=404, detail="URL not found")
+    
+    # A deleted custom code can be reused for another URL, so clients must
+    # revalidate; the ETag turns repeat fetches into a 304
+    headers = {
+        "Cache-Control": "no-cache",
+        "ETag": make_etag(short_code, url["original_url"]),
+    }
+    if etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    
+    # QR rendering is CPU-bound, keep it off the event loop
+    png = await asyncio.get_running_loop().run_in_executor(None, generate_qr_code, url["original_url"])
+    
+    return Response(content=png, media_type="image/png", headers=headers)
 
 
 @api_router.get("/{short_code}")
 async def redirect_url(short_code: str):
     """Redirect to original URL and increment click count"""
-    url = await db.urls.find_one({"short_code": short_code})
-    if not url:
-        raise HTTPException(status_code=404, detail="URL not found")
+    original_url = get_cached_url(short_code)
+    if original_url is None:
+        generation = _cache_generations[short_code]
+        url = await db.urls.find_one({"short_code": short_code}, {"original_url": 1, "_id": 0})
+        if not url:
+            raise HTTPException(status_code=404, detail="URL not found")
+        original_url = url["original_url"]
+        cache_url(short_code, original_url, generation)
     
-    # Increment click count
-    await db.urls.update_one(
-        {"short_code": short_code},
-        {"$inc": {"clicks": 1}}
-    )
+    # Increment click count after responding (flushed in batches by click_flusher)
+    _pending_clicks[short_code] += 1
     
-    return RedirectResponse(url=url["original_url"])
+    return RedirectResponse(url=original_url)
 
 
 # Include the router in the main app
@@ -172,6 +465,7 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
 # Configure logging
@@ -181,6 +475,17 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_indexes():
+    await db.urls.create_index("short_code", unique=True)
+    await db.urls.create_index([("created_at", -1), ("_id", -1)])
+
+@app.on_event("startup")
+async def start_click_flusher():
+    app.state.click_flusher = asyncio.create_task(click_flusher())
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    _stop_click_flusher.set()
+    await app.state.click_flusher
     client.close()
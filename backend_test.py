@@ -7,11 +7,12 @@ Tests all endpoints of the URL shortener service
 import requests
 import json
 import sys
+import time
 from datetime import datetime
-import base64
 
 # Configuration
 BASE_URL = "https://shrinkurl.preview.emergentagent.com/api"
+CLICK_FLUSH_WAIT = 2  # seconds, longer than the server's click flush interval
 
 class URLShortenerTester:
     def __init__(self):
@@ -48,7 +49,7 @@ class URLShortenerTester:
             data = response.json()
             
             # Verify required fields
-            required_fields = ["original_url", "short_code", "clicks", "created_at", "qr_code", "custom"]
+            required_fields = ["original_url", "short_code", "clicks", "created_at", "custom"]
             missing_fields = [field for field in required_fields if field not in data]
             
             if missing_fields:
@@ -68,16 +69,14 @@ class URLShortenerTester:
                 self.log_test("Create shortened URL", False, f"Custom should be False, got: {data['custom']}")
                 return None
                 
-            if not data["qr_code"].startswith("data:image/png;base64,"):
-                self.log_test("Create shortened URL", False, f"QR code format invalid: {data['qr_code'][:50]}...")
+            # QR code is served separately as a PNG image
+            qr_response = self.session.get(f"{self.base_url}/qr/{data['short_code']}")
+            if qr_response.status_code != 200:
+                self.log_test("Create shortened URL", False, f"QR code status code: {qr_response.status_code}")
                 return None
                 
-            # Verify QR code is valid base64
-            try:
-                qr_data = data["qr_code"].split(",")[1]
-                base64.b64decode(qr_data)
-            except Exception as e:
-                self.log_test("Create shortened URL", False, f"Invalid base64 QR code: {e}")
+            if qr_response.headers.get("Content-Type") != "image/png" or not qr_response.content.startswith(b"\x89PNG"):
+                self.log_test("Create shortened URL", False, f"QR code is not a PNG image: {qr_response.headers.get('Content-Type')}")
                 return None
                 
             self.created_urls.append(data)
@@ -263,6 +262,9 @@ class URLShortenerTester:
                 self.log_test("Redirect and increment", False, f"Wrong redirect URL. Expected: {expected_url}, Got: {location}")
                 return None
                 
+            # Click increments are flushed to the database in batches
+            time.sleep(CLICK_FLUSH_WAIT)
+            
             # Get updated stats
             stats_response = self.session.get(f"{self.base_url}/stats/{short_code}")
             if stats_response.status_code != 200:
@@ -359,6 +361,198 @@ class URLShortenerTester:
         except Exception as e:
             self.log_test("Stats for non-existent URL", False, f"Exception: {e}")
             
+    def test_shorten_batch(self):
+        """Test POST /api/shorten/batch - Create several shortened URLs at once"""
+        print("\n=== Test 9: Create shortened URLs in a batch ===")
+        
+        payload = [
+            {"original_url": "https://www.python.org"},
+            {"original_url": "https://www.mongodb.com"}
+        ]
+        
+        try:
+            response = self.session.post(f"{self.base_url}/shorten/batch", json=payload)
+            
+            if response.status_code != 200:
+                self.log_test("Batch shorten", False, f"Status code: {response.status_code}, Response: {response.text}")
+                return None
+                
+            data = response.json()
+            
+            if not isinstance(data, list) or len(data) != len(payload):
+                self.log_test("Batch shorten", False, f"Should return {len(payload)} URLs, got: {data}")
+                return None
+                
+            if [item["original_url"] for item in data] != [item["original_url"] for item in payload]:
+                self.log_test("Batch shorten", False, f"URLs returned out of order: {data}")
+                return None
+                
+            if len({item["short_code"] for item in data}) != len(data):
+                self.log_test("Batch shorten", False, f"Short codes are not unique: {data}")
+                return None
+                
+            self.created_urls.extend(data)
+            self.log_test("Batch shorten", True, f"Created {len(data)} URLs: {[item['short_code'] for item in data]}")
+            return data
+            
+        except Exception as e:
+            self.log_test("Batch shorten", False, f"Exception: {e}")
+            return None
+            
+    def test_conditional_get(self):
+        """Test If-None-Match on GET /api/urls and /api/stats/{short_code} - Should return 304"""
+        print("\n=== Test 10: Conditional GET with ETag ===")
+        
+        if not self.created_urls:
+            self.log_test("Conditional GET", False, "No URLs created to test ETags")
+            return None
+            
+        short_code = self.created_urls[0]["short_code"]
+        
+        for name, url in [("urls", f"{self.base_url}/urls"), ("stats", f"{self.base_url}/stats/{short_code}")]:
+            try:
+                response = self.session.get(url)
+                etag = response.headers.get("ETag")
+                
+                if response.status_code != 200 or not etag:
+                    self.log_test(f"Conditional GET {name}", False, f"Status code: {response.status_code}, ETag: {etag}")
+                    continue
+                    
+                response = self.session.get(url, headers={"If-None-Match": etag})
+                
+                if response.status_code != 304 or response.content:
+                    self.log_test(f"Conditional GET {name}", False, f"Should return empty 304, got: {response.status_code}")
+                    continue
+                    
+                self.log_test(f"Conditional GET {name}", True, f"Returned 304 for ETag {etag}")
+                
+            except Exception as e:
+                self.log_test(f"Conditional GET {name}", False, f"Exception: {e}")
+                
+    def test_pagination(self):
+        """Test GET /api/urls paging - Walk two pages without skipping or repeating URLs"""
+        print("\n=== Test 11: Paginate URLs ===")
+        
+        try:
+            # A batch is inserted within the same millisecond or two, so the
+            # page boundary below falls inside a group of equal created_at
+            payload = [{"original_url": f"https://example.com/page/{i}"} for i in range(3)]
+            response = self.session.post(f"{self.base_url}/shorten/batch", json=payload)
+            if response.status_code != 200:
+                self.log_test("Pagination", False, f"Could not create batch: {response.status_code}")
+                return None
+            batch_codes = [item["short_code"] for item in response.json()]
+            self.created_urls.extend(response.json())
+            
+            response = self.session.get(f"{self.base_url}/urls", params={"limit": 4})
+            expected = [item["short_code"] for item in response.json()]
+            
+            first = self.session.get(f"{self.base_url}/urls", params={"limit": 2})
+            cursor = first.headers.get("X-Next-Cursor")
+            if not cursor:
+                self.log_test("Pagination", False, "First page has no X-Next-Cursor header")
+                return None
+                
+            second = self.session.get(f"{self.base_url}/urls", params={"limit": 2, "before": cursor})
+            if second.status_code != 200:
+                self.log_test("Pagination", False, f"Second page status code: {second.status_code}")
+                return None
+                
+            paged = [item["short_code"] for item in first.json() + second.json()]
+            
+            if paged != expected:
+                self.log_test("Pagination", False, f"Pages {paged} do not match single request {expected}")
+                return None
+                
+            if paged[:3] != batch_codes[::-1]:
+                self.log_test("Pagination", False, f"Newest batch {batch_codes[::-1]} not at the start of {paged}")
+                return None
+                
+            self.log_test("Pagination", True, f"Two pages returned {paged} with nothing skipped or repeated")
+            return True
+            
+        except Exception as e:
+            self.log_test("Pagination", False, f"Exception: {e}")
+            return None
+            
+    def test_shorten_batch_rollback(self):
+        """Test POST /api/shorten/batch with a taken custom code - Should fail and create nothing"""
+        print("\n=== Test 12: Batch with a taken custom code ===")
+        
+        if not self.created_urls:
+            self.log_test("Batch rollback", False, "No URLs created to collide with")
+            return None
+            
+        fresh_code = f"batch{int(time.time())}"
+        random_url = f"https://www.example.org/{fresh_code}"
+        payload = [
+            {"original_url": "https://www.rust-lang.org", "custom_code": fresh_code},
+            {"original_url": random_url},
+            {"original_url": "https://www.example.net", "custom_code": self.created_urls[0]["short_code"]}
+        ]
+        
+        try:
+            response = self.session.post(f"{self.base_url}/shorten/batch", json=payload)
+            
+            if response.status_code != 400 or "already taken" not in response.json().get("detail", "").lower():
+                self.log_test("Batch rollback", False, f"Should return 400, got: {response.status_code}, Response: {response.text}")
+                return False
+                
+            stats_response = self.session.get(f"{self.base_url}/stats/{fresh_code}")
+            if stats_response.status_code != 404:
+                self.log_test("Batch rollback", False, f"Custom code {fresh_code} was created, stats returned: {stats_response.status_code}")
+                return False
+                
+            recent = self.session.get(f"{self.base_url}/urls", params={"limit": 10}).json()
+            if any(item["original_url"] == random_url for item in recent):
+                self.log_test("Batch rollback", False, f"Random-code URL {random_url} was created")
+                return False
+                
+            self.log_test("Batch rollback", True, "Rejected batch with 400 and created none of its URLs")
+            return True
+            
+        except Exception as e:
+            self.log_test("Batch rollback", False, f"Exception: {e}")
+            return False
+            
+    def test_qr_code(self):
+        """Test GET /api/qr/{short_code}.png - Alias, ETag revalidation and codes containing '.'"""
+        print("\n=== Test 13: QR code endpoint ===")
+        
+        if not self.created_urls:
+            self.log_test("QR code", False, "No URLs created to test QR codes")
+            return None
+            
+        short_code = self.created_urls[0]["short_code"]
+        
+        try:
+            plain = self.session.get(f"{self.base_url}/qr/{short_code}")
+            aliased = self.session.get(f"{self.base_url}/qr/{short_code}.png")
+            
+            if aliased.status_code != 200 or aliased.content != plain.content:
+                self.log_test("QR code .png alias", False, f"Status code: {aliased.status_code}, matches plain route: {aliased.content == plain.content}")
+            else:
+                self.log_test("QR code .png alias", True, f"/qr/{short_code}.png serves the same PNG")
+                
+            etag = aliased.headers.get("ETag")
+            response = self.session.get(f"{self.base_url}/qr/{short_code}.png", headers={"If-None-Match": etag or ""})
+            if not etag or response.status_code != 304 or response.content:
+                self.log_test("QR code 304", False, f"Should return empty 304 for ETag {etag}, got: {response.status_code}")
+            else:
+                self.log_test("QR code 304", True, f"Returned 304 for ETag {etag}")
+                
+            response = self.session.post(f"{self.base_url}/shorten", json={
+                "original_url": "https://www.example.com",
+                "custom_code": "qr.png"
+            })
+            if response.status_code != 400:
+                self.log_test("Custom code with '.'", False, f"Should return 400, got: {response.status_code}")
+            else:
+                self.log_test("Custom code with '.'", True, "Correctly rejected custom code containing '.'")
+                
+        except Exception as e:
+            self.log_test("QR code", False, f"Exception: {e}")
+            
     def run_all_tests(self):
         """Run all tests in sequence"""
         print(f"🚀 Starting URL Shortener API Tests")
@@ -374,6 +568,11 @@ class URLShortenerTester:
         self.test_redirect_and_increment()
         self.test_delete_url()
         self.test_error_cases()
+        self.test_shorten_batch()
+        self.test_conditional_get()
+        self.test_pagination()
+        self.test_shorten_batch_rollback()
+        self.test_qr_code()
         
         # Summary
         print("\n" + "=" * 60)
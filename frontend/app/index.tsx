@@ -24,13 +24,14 @@ import axios from 'axios';
 
 const BACKEND_URL = process.env.EXPO_PUBLIC_BACKEND_URL;
 const { width } = Dimensions.get('window');
+const PAGE_SIZE = 50;
 
 interface URL {
   original_url: string;
   short_code: string;
   clicks: number;
   created_at: string;
-  qr_code: string;
+  qr_code?: string | null;
   custom: boolean;
 }
 
@@ -40,6 +41,8 @@ export default function Index() {
   const [urls, setUrls] = useState<URL[]>([]);
   const [loading, setLoading] = useState(false);
   const [fetchingUrls, setFetchingUrls] = useState(true);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [selectedQR, setSelectedQR] = useState<string | null>(null);
   const [showCustomCode, setShowCustomCode] = useState(false);
   
@@ -67,8 +70,11 @@ export default function Index() {
   const fetchUrls = async () => {
     try {
       setFetchingUrls(true);
-      const response = await axios.get(`${BACKEND_URL}/api/urls`);
+      const response = await axios.get(`${BACKEND_URL}/api/urls`, {
+        params: { limit: PAGE_SIZE },
+      });
       setUrls(response.data);
+      setNextCursor(response.headers['x-next-cursor'] ?? null);
     } catch (error) {
       console.error('Error fetching URLs:', error);
       Alert.alert('Error', 'Failed to fetch URLs');
@@ -77,6 +83,23 @@ export default function Index() {
     }
   };
 
+  const loadMoreUrls = async () => {
+    if (!nextCursor) return;
+    try {
+      setLoadingMore(true);
+      const response = await axios.get(`${BACKEND_URL}/api/urls`, {
+        params: { limit: PAGE_SIZE, before: nextCursor },
+      });
+      setUrls([...urls, ...response.data]);
+      setNextCursor(response.headers['x-next-cursor'] ?? null);
+    } catch (error) {
+      console.error('Error fetching more URLs:', error);
+      Alert.alert('Error', 'Failed to fetch more URLs');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const shortenUrl = async () => {
     if (!originalUrl.trim()) {
       Alert.alert('Oops! 🤔', 'Please enter a URL to shorten');
@@ -142,6 +165,10 @@ export default function Index() {
     return `${BACKEND_URL}/api/${shortCode}`;
   };
 
+  const getQrUrl = (shortCode: string) => {
+    return `${BACKEND_URL}/api/qr/${shortCode}.png`;
+  };
+
   const formatDate = (dateString: string) => {
     const date = new Date(dateString);
     return date.toLocaleDateString('en-US', {
@@ -377,7 +404,7 @@ export default function Index() {
 
                         <TouchableOpacity
                           style={styles.actionBtn}
-                          onPress={() => setSelectedQR(url.qr_code)}
+                          onPress={() => setSelectedQR(getQrUrl(url.short_code))}
                           activeOpacity={0.7}
                         >
                           <LinearGradient
@@ -407,6 +434,21 @@ export default function Index() {
                   </Pressable>
                 ))
               )}
+
+              {!fetchingUrls && nextCursor && (
+                <TouchableOpacity
+                  onPress={loadMoreUrls}
+                  style={styles.loadMoreButton}
+                  disabled={loadingMore}
+                  activeOpacity={0.7}
+                >
+                  {loadingMore ? (
+                    <ActivityIndicator color="#ffffff" />
+                  ) : (
+                    <Text style={styles.loadMoreText}>Load more</Text>
+                  )}
+                </TouchableOpacity>
+              )}
             </View>
           </ScrollView>
         </KeyboardAvoidingView>
@@ -644,6 +686,15 @@ const styles = StyleSheet.create({
     color: 'rgba(255, 255, 255, 0.8)',
     textAlign: 'center',
   },
+  loadMoreButton: {
+    alignItems: 'center',
+    paddingVertical: 16,
+  },
+  loadMoreText: {
+    color: '#ffffff',
+    fontSize: 16,
+    fontWeight: '600',
+  },
   urlCard: {
     marginBottom: 16,
     borderRadius: 20,